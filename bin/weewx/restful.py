@@ -1,36 +1,109 @@
+import functools
 import serial
 import time
 import weewx
+import weewx.units
 import weeutil.weeutil
-from typing import Optional, Dict, Any, Union
-from dataclasses import dataclass
-from enum import Enum
+from typing import Optional, Dict, Any, Callable, Iterable, List, Tuple, Union
+from dataclasses import dataclass, field
+from enum import IntEnum
+
+_DOTS3 = "..."
+_DOTS2 = ".."
+
+def _u3(val: Optional[float]) -> str:
+    """Format a value as a 3-character APRS field, or '...' if missing."""
+    return _DOTS3 if val is None else "%03d" % max(-99, min(999, int(val)))
+
+def _u3_centi(val: Optional[float]) -> str:
+    """Format a value in hundredths as a 3-character APRS field, or '...' if missing."""
+    return _DOTS3 if val is None else "%03d" % max(-99, min(999, int(val * 100)))
+
+@functools.lru_cache(maxsize=4)
+def _baro_to_mbar_factor(us_units: int) -> float:
+    """Return the multiplier converting barometer readings in a unit system to mbar."""
+    unit, group = weewx.units.getStandardUnitType(us_units, 'barometer')
+    return weewx.units.convert((1.0, unit, group), 'mbar')[0]
+
+def _fmt_barometer(baro: Optional[float], us_units: int) -> str:
+    """Format barometer data as tenths of mbar."""
+    if baro is None:
+        return "b....."
+    return "b%05d" % int(baro * _baro_to_mbar_factor(us_units) * 10)
+
+def _fmt_humidity(humidity: Optional[float]) -> str:
+    """Format humidity data; 100% is encoded as 00."""
+    if humidity is None:
+        return "h" + _DOTS2
+    if humidity >= 100.0:
+        return "h00"
+    return "h%02d" % int(humidity)
+
+def _fmt_radiation(radiation: Optional[float]) -> str:
+    """Format radiation data, or nothing if missing or out of range."""
+    if radiation is None:
+        return ""
+    if radiation < 1000.0:
+        return "L%03d" % int(radiation)
+    if radiation < 2000.0:
+        return "l%03d" % int(radiation - 1000)
+    return ""
+
+# (prefix, record field, formatter) for the fixed-width fields, in packet order
+_FIELD_SPECS = (
+    ("_", 'windDir', _u3),
+    ("/", 'windSpeed', _u3),
+    ("g", 'windGust', _u3),
+    ("t", 'outTemp', _u3),
+    ("r", 'rain', _u3_centi),
+    ("p", 'rain24', _u3_centi),
+    ("P", 'dailyrain', _u3_centi),
+)
+
+# Every record field used in a packet: the table fields, then barometer,
+# humidity and radiation
+_FIELD_NAMES = tuple(name for _, name, _ in _FIELD_SPECS) + ('barometer', 'outHumidity', 'radiation')
+
+def _record_values(record: Dict[str, Any]) -> Tuple[Any, ...]:
+    """Fetch all packet fields from a record; missing fields are None."""
+    return tuple(map(record.get, _FIELD_NAMES))
+
+# Static TNC command bytes
+_CTRL_C = b"\x03"
+_CONV = b"conv\r"
+_CR = b"\r"
 
 class APRSError(Exception):
     """Custom exception for APRS-related errors."""
     pass
 
+_VALID_PARITIES = frozenset("NEOMS")
+_VALID_PARITIES_REPR = "{'N', 'E', 'O', 'M', 'S'}"
+
 class SerialConfig:
     """Handles serial port configuration validation."""
-    VALID_PARITIES = {'N', 'E', 'O', 'M', 'S'}
+    VALID_PARITIES = _VALID_PARITIES
     
     @staticmethod
     def validate_parity(parity: str) -> str:
         parity = parity.upper()
-        if parity not in SerialConfig.VALID_PARITIES:
-            raise ValueError(f"Invalid parity value. Must be one of {SerialConfig.VALID_PARITIES}")
+        if parity not in _VALID_PARITIES:
+            raise ValueError("Invalid parity value. Must be one of " + _VALID_PARITIES_REPR)
         return parity
 
-class APRSStatus(Enum):
+class APRSStatus(IntEnum):
     """Enum for APRS status codes."""
-    DISABLED = "Disabled"
-    STALE = "Stale"
-    INTERVAL_WAIT = "Interval Wait"
-    NON_LATEST = "Non Latest Record"
-    INVALID_UNITS = "Invalid Units"
-    SUCCESS = "Success"
-
-@dataclass
+    DISABLED = 0
+    STALE = 1
+    INTERVAL_WAIT = 2
+    NON_LATEST = 3
+    INVALID_UNITS = 4
+    SUCCESS = 5
+
+# Human-readable messages, indexed by APRSStatus
+_APRS_MSG = ("Disabled", "Stale", "Interval Wait", "Non Latest Record", "Invalid Units", "Success")
+
+@dataclass(slots=True, frozen=True)
 class APRSConfig:
     """Configuration data class for APRS settings."""
     station: str
@@ -48,11 +121,14 @@ class APRSConfig:
     interval: int = 0
     stale: int = 1800
     max_tries: int = 3
+    tnc_delay: float = 1.0
+    latlon_str: str = field(init=False, repr=False)
 
     def __post_init__(self):
         """Validate configuration after initialization."""
-        self.station = self.station.upper()
-        self.parity = SerialConfig.validate_parity(self.parity)
+        # Frozen dataclass: normalized values are set through object.__setattr__
+        object.__setattr__(self, 'station', self.station.upper())
+        object.__setattr__(self, 'parity', SerialConfig.validate_parity(self.parity))
         
         if not -90 <= self.latitude <= 90:
             raise ValueError("Latitude must be between -90 and 90 degrees")
@@ -64,14 +140,19 @@ class APRSConfig:
             raise ValueError("Stale threshold cannot be negative")
         if self.max_tries < 1:
             raise ValueError("Max tries must be at least 1")
+        if self.tnc_delay < 0:
+            raise ValueError("TNC delay cannot be negative")
 
-class APRS:
-    """Upload weather data using the APRS protocol."""
+        # Position never changes, so format it once. latlon_string returns
+        # (degrees, minutes, hemisphere) tuples, e.g. 4530.00N/12236.00W
+        lat = weeutil.weeutil.latlon_string(self.latitude, ('N', 'S'), 'lat')
+        lon = weeutil.weeutil.latlon_string(self.longitude, ('E', 'W'), 'lon')
+        object.__setattr__(self, 'latlon_str', "%s%s%s/%s%s%s" % (lat + lon))
 
-    def __init__(self, site: str, **kwargs):
-        """Initialize APRS uploader with configuration."""
-        self.site = site
-        self.config = APRSConfig(
+    @classmethod
+    def from_kwargs(cls, kwargs: Dict[str, Any]) -> 'APRSConfig':
+        """Build a configuration from the raw weewx.conf option strings."""
+        return cls(
             station=kwargs['station'],
             latitude=float(kwargs['latitude']),
             longitude=float(kwargs['longitude']),
@@ -86,19 +167,37 @@ class APRS:
             enabled=bool(int(kwargs['enabled'])),
             interval=int(kwargs.get('interval', 0)),
             stale=int(kwargs.get('stale', 1800)),
-            max_tries=int(kwargs.get('max_tries', 3))
+            max_tries=int(kwargs.get('max_tries', 3)),
+            tnc_delay=float(kwargs.get('tnc_delay', 1.0))
         )
+
+class APRS:
+    """Upload weather data using the APRS protocol."""
+
+    def __init__(self, site: str, **kwargs):
+        """Initialize APRS uploader with configuration."""
+        self.site = site
+        self.config = APRSConfig.from_kwargs(kwargs)
         self._lastpost: Optional[int] = None
+        self._ser: Optional[serial.Serial] = None
+        # Last formatted packet, reused when a caller reposts the same record
+        self._last_packet_key: Optional[Tuple[Any, ...]] = None
+        self._last_packet: Optional[str] = None
+
+        # Constant parts of every upload
+        cfg = self.config
+        self._hardware_str = ".DsVP" if cfg.hardware == "VantagePro" else ".Unkn"
+        self._mycall_cmd = f"mycall {cfg.station}\r".encode()
+        self._unproto_cmd = f"unproto {cfg.unproto}\r".encode()
+        self._status_cmd = f">{cfg.status_message}\r".encode()
+        self._tnc_setup = self._mycall_cmd + self._unproto_cmd + _CONV
         
     def _check_post_conditions(self, archive: Any, time_ts: int) -> APRSStatus:
         """Check if conditions are met for posting data."""
         if not self.config.enabled:
             return APRSStatus.DISABLED
 
-        last_ts = archive.lastGoodStamp()
-        if time_ts != last_ts:
-            return APRSStatus.NON_LATEST
-
+        # Cheap local checks first so throttled ticks skip the archive query
         how_old = time.time() - time_ts
         if how_old > self.config.stale:
             return APRSStatus.STALE
@@ -106,123 +205,135 @@ class APRS:
         if self._lastpost and time_ts - self._lastpost < self.config.interval:
             return APRSStatus.INTERVAL_WAIT
 
+        last_ts = archive.lastGoodStamp()
+        if time_ts != last_ts:
+            return APRSStatus.NON_LATEST
+
         return APRSStatus.SUCCESS
 
+    def _get_serial(self) -> serial.Serial:
+        """Return the open serial port, opening it on first use."""
+        if self._ser is not None and self._ser.is_open:
+            return self._ser
+        self._ser = serial.Serial(
+            port=self.config.port,
+            baudrate=self.config.baudrate,
+            bytesize=self.config.databits,
+            parity=self.config.parity,
+            stopbits=self.config.stopbits
+        )
+        # Linux only: skip the tty layer's buffering timer for short TNC writes
+        try:
+            self._ser.set_low_latency_mode(True)
+        except (AttributeError, IOError, ValueError):
+            pass
+        return self._ser
+
+    def _close_serial(self) -> None:
+        """Close the serial port so the next upload reopens it."""
+        if self._ser is not None:
+            try:
+                self._ser.close()
+            except serial.SerialException:
+                pass
+            self._ser = None
+
     def _send_tnc_commands(self, ser: serial.Serial, packet: str) -> None:
-        """Send commands to TNC with proper timing and error handling."""
-        commands = [
-            ("\x03", 1),  # ctrl-C
-            (f"mycall {self.config.station}\r", 1),
-            (f"unproto {self.config.unproto}\r", 1),
-            ("conv\r", 1),
-            (f"{packet}\r", 1),
-            (f">{self.config.status_message}\r", 1),
-            ("\x03", 0)
-        ]
+        """Send commands to TNC, pausing around each mode switch."""
+        # Commands are batched between the mode switches (ctrl-C into command
+        # mode, conv into converse mode, ctrl-C back out). Each batch is flushed
+        # and followed by tnc_delay, since TNCs vary in how long a switch takes.
+        batches = (
+            _CTRL_C,
+            self._tnc_setup,
+            packet.encode() + _CR + self._status_cmd,
+            _CTRL_C,
+        )
+        delay = self.config.tnc_delay
 
         try:
-            for cmd, delay in commands:
-                ser.write(cmd.encode())
-                if delay:
+            for i, batch in enumerate(batches):
+                if i and delay:
                     time.sleep(delay)
+                ser.write(batch)
+                ser.flush()
         except serial.SerialException as e:
             raise APRSError(f"Failed to send TNC commands: {str(e)}")
 
+    def _append_packet(self, app: Callable[[str], None], record: Dict[str, Any],
+                       values: Tuple[Any, ...]) -> None:
+        """Append the fragments of one packet onto app.
+
+        values holds the record's packet fields, as returned by _record_values.
+        """
+        *fields, baro, humidity, radiation = values
+        app(time.strftime("@%d%H%Mz", time.gmtime(record['dateTime'])))
+        app(self.config.latlon_str)
+        for (prefix, _, fmt), val in zip(_FIELD_SPECS, fields):
+            app(prefix)
+            app(fmt(val))
+        app(_fmt_barometer(baro, record['usUnits']))
+        app(_fmt_humidity(humidity))
+        app(_fmt_radiation(radiation))
+        app(self._hardware_str)
+
+    def _format_values(self, record: Dict[str, Any], values: Tuple[Any, ...]) -> str:
+        """Format one packet from a record's already-fetched field values."""
+        parts: List[str] = []
+        self._append_packet(parts.append, record, values)
+        return "".join(parts)
+
     def format_weather_data(self, record: Dict[str, Any]) -> str:
         """Format weather data according to APRS protocol specifications."""
-        time_tt = time.gmtime(record['dateTime'])
-        time_str = time.strftime("@%d%H%Mz", time_tt)
-
-        # Position formatting
-        lat_str = weeutil.weeutil.latlon_string(self.config.latitude, ('N', 'S'), 'lat')
-        lon_str = weeutil.weeutil.latlon_string(self.config.longitude, ('E', 'W'), 'lon')
-        latlon_str = f"{lat_str}{lon_str}"
-
-        # Weather metrics formatting
-        wind_temp = self._format_wind_temp(record)
-        rain = self._format_rain(record)
-        baro = self._format_barometer(record)
-        humidity = self._format_humidity(record)
-        radiation = self._format_radiation(record)
-        
-        # Hardware identifier
-        hardware_str = ".DsVP" if self.config.hardware == "VantagePro" else ".Unkn"
-
-        return f"{time_str}{latlon_str}{wind_temp}{rain}{baro}{humidity}{radiation}{hardware_str}"
-
-    def _format_wind_temp(self, record: Dict[str, Any]) -> str:
-        """Format wind and temperature data."""
-        values = []
-        for field in ('windDir', 'windSpeed', 'windGust', 'outTemp'):
-            val = record.get(field)
-            values.append(f"{int(val):03d}" if val is not None else "...")
-        return f"_{values[0]}/{values[1]}g{values[2]}t{values[3]}"
-
-    def _format_rain(self, record: Dict[str, Any]) -> str:
-        """Format rain data."""
-        values = []
-        for field in ('rain', 'rain24', 'dailyrain'):
-            val = record.get(field)
-            values.append(f"{int(val * 100):03d}" if val is not None else "...")
-        return f"r{values[0]}p{values[1]}P{values[2]}"
-
-    def _format_barometer(self, record: Dict[str, Any]) -> str:
-        """Format barometer data."""
-        baro = record.get('barometer')
-        if baro is None:
-            return "b....."
-        
-        unit_type = weewx.units.getStandardUnitType(record['usUnits'], 'barometer')
-        baro_mbar = weewx.units.convert((baro, unit_type[0], unit_type[1]), 'mbar')
-        return f"b{int(baro_mbar[0] * 10):05d}"
-
-    def _format_humidity(self, record: Dict[str, Any]) -> str:
-        """Format humidity data."""
-        humidity = record.get('outHumidity')
-        if humidity is None:
-            return "h.."
-        return f"h{int(humidity):02d}" if humidity < 100.0 else "h00"
-
-    def _format_radiation(self, record: Dict[str, Any]) -> str:
-        """Format radiation data."""
-        radiation = record.get('radiation')
-        if radiation is None:
-            return ""
-        if radiation < 1000.0:
-            return f"L{int(radiation):03d}"
-        if radiation < 2000.0:
-            return f"l{int(radiation - 1000):03d}"
-        return ""
+        return self._format_values(record, _record_values(record))
+
+    def format_many(self, records: Iterable[Dict[str, Any]]) -> str:
+        """Format several records in one pass, one packet per line.
+
+        Used when catching up after an outage; produces the same packets as
+        format_weather_data, joined once for the whole batch.
+        """
+        out: List[str] = []
+        app = out.append
+        append_packet = self._append_packet
+        values_of = _record_values
+        for record in records:
+            append_packet(app, record, values_of(record))
+            app("\n")
+        return "".join(out)
 
     def postData(self, archive: Any, time_ts: int) -> None:
         """Post weather data to APRS network."""
         status = self._check_post_conditions(archive, time_ts)
         
         if status != APRSStatus.SUCCESS:
-            raise "APRS: {status.value}"
+            raise APRSError("APRS: " + _APRS_MSG[status])
 
         record = self.extractRecordFrom(archive, time_ts)
         
         if record['usUnits'] != weewx.US:
-            raise "APRS: Units must be US Customary."
+            raise APRSError("APRS: Units must be US Customary.")
 
-        packet = self.format_weather_data(record)
+        values = _record_values(record)
+        key = (record['dateTime'], record['usUnits']) + values
+        if key == self._last_packet_key:
+            packet = self._last_packet
+        else:
+            packet = self._format_values(record, values)
+            self._last_packet_key = key
+            self._last_packet = packet
 
         try:
-            with serial.Serial(
-                port=self.config.port,
-                baudrate=self.config.baudrate,
-                bytesize=self.config.databits,
-                parity=self.config.parity,
-                stopbits=self.config.stopbits
-            ) as ser:
-                ser.flushOutput()
-                ser.flushInput()
-                self._send_tnc_commands(ser, packet)
-                
+            ser = self._get_serial()
+            ser.reset_output_buffer()
+            ser.reset_input_buffer()
+            self._send_tnc_commands(ser, packet)
+
         except serial.SerialException as e:
+            self._close_serial()
             raise APRSError(f"Serial communication error: {str(e)}")
         except Exception as e:
+            self._close_serial()
             raise APRSError(f"Unexpected error during APRS upload: {str(e)}")
 
         self._lastpost = time_ts
\ No newline at end of file
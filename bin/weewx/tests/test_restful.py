@@ -0,0 +1,121 @@
+"""Tests for the APRS uploader in bin/weewx/restful.py."""
+import importlib.util
+import os
+import time
+import unittest
+from unittest import mock
+
+import weewx
+
+# restful.py lives alongside, not inside, the installed weewx package
+_spec = importlib.util.spec_from_file_location(
+    'restful', os.path.join(os.path.dirname(__file__), '..', 'restful.py'))
+restful = importlib.util.module_from_spec(_spec)
+_spec.loader.exec_module(restful)
+
+CONFIG = {
+    'station': 'n8qq',
+    'latitude': '45.5',
+    'longitude': '-122.6',
+    'hardware': 'VantagePro',
+    'port': '/dev/ttyUSB0',
+    'baudrate': '9600',
+    'databits': '8',
+    'parity': 'n',
+    'stopbits': '1',
+    'unproto': 'APRS via WIDE2-2',
+    'status_message': 'Test station',
+    'enabled': '1',
+}
+
+
+class FormatWeatherDataTest(unittest.TestCase):
+
+    def setUp(self):
+        self.aprs = restful.APRS('APRS', **CONFIG)
+
+    def test_position(self):
+        self.assertEqual(self.aprs.config.latlon_str, '4530.00N/12236.00W')
+
+    def test_full_record(self):
+        record = {'dateTime': 0, 'usUnits': weewx.US, 'windDir': 90.0,
+                  'windSpeed': 5.7, 'windGust': 12.0, 'outTemp': 72.4,
+                  'rain': 0.25, 'rain24': 1.5, 'dailyrain': 0.5,
+                  'barometer': 30.0, 'outHumidity': 55.0, 'radiation': 500.0}
+        self.assertEqual(self.aprs.format_weather_data(record),
+                         '@010000z4530.00N/12236.00W_090/005g012t072'
+                         'r025p150P050b10159h55L500.DsVP')
+
+    def test_missing_fields(self):
+        # Standard weewx schemas have no rain24 or dailyrain
+        record = {'dateTime': 0, 'usUnits': weewx.US, 'outTemp': -5.2,
+                  'windDir': None, 'outHumidity': 100.0}
+        self.assertEqual(self.aprs.format_weather_data(record),
+                         '@010000z4530.00N/12236.00W_.../...g...t-05'
+                         'r...p...P...b.....h00.DsVP')
+
+    def test_format_many_matches_single(self):
+        records = [{'dateTime': 300 * i, 'usUnits': weewx.US, 'outTemp': 60.0 + i,
+                    'barometer': 29.9, 'radiation': 1500.0 * i} for i in range(3)]
+        expected = "".join(self.aprs.format_weather_data(r) + "\n" for r in records)
+        self.assertEqual(self.aprs.format_many(records), expected)
+
+
+class PostDataTest(unittest.TestCase):
+
+    def setUp(self):
+        self.aprs = restful.APRS('APRS', **CONFIG)
+        self.now = int(time.time())
+        self.record = {'dateTime': self.now, 'usUnits': weewx.US, 'outTemp': 50.0}
+        self.aprs.extractRecordFrom = lambda archive, time_ts: dict(self.record)
+        self.archive = mock.Mock()
+        self.archive.lastGoodStamp.return_value = self.now
+        patcher = mock.patch.object(restful.serial, 'Serial')
+        self.serial = patcher.start()
+        self.addCleanup(patcher.stop)
+        patcher = mock.patch.object(restful.time, 'sleep')
+        self.sleep = patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def test_sends_packet(self):
+        self.aprs.postData(self.archive, self.now)
+        writes = [c.args[0] for c in self.serial.return_value.write.call_args_list]
+        packet = self.aprs.format_weather_data(self.record).encode()
+        self.assertEqual(writes, [
+            b"\x03",
+            b"mycall N8QQ\runproto APRS via WIDE2-2\rconv\r",
+            packet + b"\r>Test station\r",
+            b"\x03",
+        ])
+
+    def test_pauses_around_mode_switches(self):
+        self.aprs.postData(self.archive, self.now)
+        self.assertEqual(self.sleep.call_args_list, [mock.call(1.0)] * 3)
+
+    def test_zero_delay_skips_pauses(self):
+        self.aprs.config = restful.APRSConfig.from_kwargs(dict(CONFIG, tnc_delay='0'))
+        self.aprs.postData(self.archive, self.now)
+        self.sleep.assert_not_called()
+
+    def test_reposting_reuses_packet(self):
+        self.aprs.postData(self.archive, self.now)
+        packet = self.aprs._last_packet
+        with mock.patch.object(self.aprs, '_format_values') as fmt:
+            self.aprs.postData(self.archive, self.now)
+            fmt.assert_not_called()
+        self.assertIs(self.aprs._last_packet, packet)
+
+    def test_changed_record_is_reformatted(self):
+        self.aprs.postData(self.archive, self.now)
+        self.record['outTemp'] = 51.0
+        self.aprs.postData(self.archive, self.now)
+        self.assertIn("t051", self.aprs._last_packet)
+
+    def test_disabled_raises(self):
+        self.aprs.config = restful.APRSConfig.from_kwargs(dict(CONFIG, enabled='0'))
+        with self.assertRaisesRegex(restful.APRSError, "APRS: Disabled"):
+            self.aprs.postData(self.archive, self.now)
+
+
+if __name__ == '__main__':
+    unittest.main()